@@ -393,6 +393,9 @@ class NDMask(_object):
 
     def to_numpy(self):
         return _cntk_py.NDMask_to_numpy(self)
+
+    def mask_from_numpy(self, pyobj):
+        return _cntk_py.NDMask_mask_from_numpy(self, pyobj)
 NDMask_swigregister = _cntk_py.NDMask_swigregister
 NDMask_swigregister(NDMask)
 
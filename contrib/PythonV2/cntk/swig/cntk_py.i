@@ -846,6 +846,47 @@
 
         return ndarray;
     }
+
+    void mask_from_numpy(PyObject* pyobj) {
+        if (!PyArray_Check((PyArrayObject*)pyobj))
+        {
+            throw std::logic_error("NumPy array expected");
+        }
+
+        PyArrayObject* array = (PyArrayObject*)pyobj;
+
+        if (PyArray_NDIM(array) != 2 || PyArray_TYPE(array) != NPY_UBYTE)
+            throw std::logic_error("2D NumPy array of type uint8 expected");
+
+        // Rows are sequences and columns are sequence positions, just as
+        // returned by to_numpy().
+        npy_intp* np_shape = PyArray_SHAPE(array);
+        std::vector<size_t> cntk_dims = (*self).Shape().Dimensions();
+        if (cntk_dims.size() != 2 || (size_t)np_shape[0] != cntk_dims[1] || (size_t)np_shape[1] != cntk_dims[0])
+            throw std::logic_error("shape of the NumPy array does not match the mask");
+
+        size_t num_seq = np_shape[0];
+        size_t max_seq_len = np_shape[1];
+        for (size_t idx = 0; idx < num_seq; idx++)
+        {
+            size_t pos = 0;
+            while (pos < max_seq_len)
+            {
+                if (*(npy_ubyte*)PyArray_GETPTR2(array, idx, pos))
+                {
+                    pos++;
+                    continue;
+                }
+
+                // mask the whole run of invalid positions at once
+                size_t start = pos;
+                while (pos < max_seq_len && !*(npy_ubyte*)PyArray_GETPTR2(array, idx, pos))
+                    pos++;
+
+                (*self).MaskSection({start, idx}, NDShape({pos - start, 1}));
+            }
+        }
+    }
 }
 
 // end NDMask
@@ -887,6 +928,19 @@
 
         if (typecode == NPY_FLOAT)
         {
+            if (!readOnly)
+            {
+                // Let the view allocate and own its storage on the target
+                // device and copy the data over from a temporary CPU view
+                // on top of the NumPy buffer. This avoids a staging buffer,
+                // which never got freed, per created view.
+                NDArrayView source(NDShape(shape), (float*)PyArray_DATA(array), num_elements, DeviceDescriptor::CPUDevice(), true);
+                NDArrayView* view = new NDArrayView(DataType::Float, StorageFormat::Dense, NDShape(shape), device);
+                view->CopyFrom(source);
+                return view;
+            }
+
+            // read-only views can only be created on top of an existing buffer
             size_t num_bytes = num_elements * sizeof(float);
             buf = malloc(num_bytes);
             memcpy(buf, PyArray_DATA(array), num_bytes);
@@ -894,6 +948,14 @@
         }
         else if (typecode == NPY_DOUBLE)
         {
+            if (!readOnly)
+            {
+                NDArrayView source(NDShape(shape), (double*)PyArray_DATA(array), num_elements, DeviceDescriptor::CPUDevice(), true);
+                NDArrayView* view = new NDArrayView(DataType::Double, StorageFormat::Dense, NDShape(shape), device);
+                view->CopyFrom(source);
+                return view;
+            }
+
             size_t num_bytes = num_elements * sizeof(double);
             buf = malloc(num_bytes);
             memcpy(buf, PyArray_DATA(array), num_bytes);
@@ -929,7 +991,10 @@
             throw std::invalid_argument("unknown CNTK data type");
         }
         
-        PyObject* ndarray = PyArray_SimpleNewFromData(dimensions.size(), shape, numpy_type, buffer);
+        // CNTK stores its data in column major order, so we hand out a
+        // Fortran-ordered array. Its transpose is then a row major view
+        // without copying any data.
+        PyObject* ndarray = PyArray_New(&PyArray_Type, dimensions.size(), shape, numpy_type, NULL, buffer, 0, NPY_ARRAY_FARRAY, NULL);
 
         return ndarray;
     }
@@ -5537,6 +5537,19 @@ SWIGINTERN CNTK::NDArrayView *new_CNTK_NDArrayView__SWIG_17(PyObject *pyobj,CNTK
 
         if (typecode == NPY_FLOAT)
         {
+            if (!readOnly)
+            {
+                // Let the view allocate and own its storage on the target
+                // device and copy the data over from a temporary CPU view
+                // on top of the NumPy buffer. This avoids a staging buffer,
+                // which never got freed, per created view.
+                NDArrayView source(NDShape(shape), (float*)PyArray_DATA(array), num_elements, DeviceDescriptor::CPUDevice(), true);
+                NDArrayView* view = new NDArrayView(DataType::Float, StorageFormat::Dense, NDShape(shape), device);
+                view->CopyFrom(source);
+                return view;
+            }
+
+            // read-only views can only be created on top of an existing buffer
             size_t num_bytes = num_elements * sizeof(float);
             buf = malloc(num_bytes);
             memcpy(buf, PyArray_DATA(array), num_bytes);
@@ -5544,6 +5557,14 @@ SWIGINTERN CNTK::NDArrayView *new_CNTK_NDArrayView__SWIG_17(PyObject *pyobj,CNTK
         }
         else if (typecode == NPY_DOUBLE)
         {
+            if (!readOnly)
+            {
+                NDArrayView source(NDShape(shape), (double*)PyArray_DATA(array), num_elements, DeviceDescriptor::CPUDevice(), true);
+                NDArrayView* view = new NDArrayView(DataType::Double, StorageFormat::Dense, NDShape(shape), device);
+                view->CopyFrom(source);
+                return view;
+            }
+
             size_t num_bytes = num_elements * sizeof(double);
             buf = malloc(num_bytes);
             memcpy(buf, PyArray_DATA(array), num_bytes);
@@ -5578,7 +5599,10 @@ SWIGINTERN PyObject *CNTK_NDArrayView_to_numpy(CNTK::NDArrayView *self){
             throw std::invalid_argument("unknown CNTK data type");
         }
         
-        PyObject* ndarray = PyArray_SimpleNewFromData(dimensions.size(), shape, numpy_type, buffer);
+        // CNTK stores its data in column major order, so we hand out a
+        // Fortran-ordered array. Its transpose is then a row major view
+        // without copying any data.
+        PyObject* ndarray = PyArray_New(&PyArray_Type, dimensions.size(), shape, numpy_type, NULL, buffer, 0, NPY_ARRAY_FARRAY, NULL);
 
         return ndarray;
     }
@@ -5644,6 +5668,46 @@ SWIGINTERN PyObject *CNTK_NDMask_to_numpy(CNTK::NDMask *self){
 
         return ndarray;
     }
+SWIGINTERN void CNTK_NDMask_mask_from_numpy(CNTK::NDMask *self,PyObject *pyobj){
+        if (!PyArray_Check((PyArrayObject*)pyobj))
+        {
+            throw std::logic_error("NumPy array expected");
+        }
+
+        PyArrayObject* array = (PyArrayObject*)pyobj;
+
+        if (PyArray_NDIM(array) != 2 || PyArray_TYPE(array) != NPY_UBYTE)
+            throw std::logic_error("2D NumPy array of type uint8 expected");
+
+        // Rows are sequences and columns are sequence positions, just as
+        // returned by to_numpy().
+        npy_intp* np_shape = PyArray_SHAPE(array);
+        std::vector<size_t> cntk_dims = (*self).Shape().Dimensions();
+        if (cntk_dims.size() != 2 || (size_t)np_shape[0] != cntk_dims[1] || (size_t)np_shape[1] != cntk_dims[0])
+            throw std::logic_error("shape of the NumPy array does not match the mask");
+
+        size_t num_seq = np_shape[0];
+        size_t max_seq_len = np_shape[1];
+        for (size_t idx = 0; idx < num_seq; idx++)
+        {
+            size_t pos = 0;
+            while (pos < max_seq_len)
+            {
+                if (*(npy_ubyte*)PyArray_GETPTR2(array, idx, pos))
+                {
+                    pos++;
+                    continue;
+                }
+
+                // mask the whole run of invalid positions at once
+                size_t start = pos;
+                while (pos < max_seq_len && !*(npy_ubyte*)PyArray_GETPTR2(array, idx, pos))
+                    pos++;
+
+                (*self).MaskSection({start, idx}, NDShape({pos - start, 1}));
+            }
+        }
+    }
 
 SWIGINTERN int
 SWIG_AsWCharPtrAndSize(PyObject *obj, wchar_t **cptr, size_t *psize, int *alloc)
@@ -13233,6 +13297,61 @@ fail:
 }
 
 
+SWIGINTERN PyObject *_wrap_NDMask_mask_from_numpy(PyObject *SWIGUNUSEDPARM(self), PyObject *args) {
+  PyObject *resultobj = 0;
+  CNTK::NDMask *arg1 = (CNTK::NDMask *) 0 ;
+  void *argp1 = 0 ;
+  int res1 = 0 ;
+  std::shared_ptr< CNTK::NDMask > tempshared1 ;
+  std::shared_ptr< CNTK::NDMask > *smartarg1 = 0 ;
+  PyObject *arg2 = (PyObject *) 0 ;
+  PyObject * obj0 = 0 ;
+  PyObject * obj1 = 0 ;
+  
+  if (!PyArg_ParseTuple(args,(char *)"OO:NDMask_mask_from_numpy",&obj0,&obj1)) SWIG_fail;
+  {
+    int newmem = 0;
+    res1 = SWIG_ConvertPtrAndOwn(obj0, &argp1, SWIGTYPE_p_std__shared_ptrT_CNTK__NDMask_t, 0 |  0 , &newmem);
+    if (!SWIG_IsOK(res1)) {
+      SWIG_exception_fail(SWIG_ArgError(res1), "in method '" "NDMask_mask_from_numpy" "', argument " "1"" of type '" "CNTK::NDMask *""'"); 
+    }
+    if (newmem & SWIG_CAST_NEW_MEMORY) {
+      tempshared1 = *reinterpret_cast< std::shared_ptr<  CNTK::NDMask > * >(argp1);
+      delete reinterpret_cast< std::shared_ptr<  CNTK::NDMask > * >(argp1);
+      arg1 = const_cast< CNTK::NDMask * >(tempshared1.get());
+    } else {
+      smartarg1 = reinterpret_cast< std::shared_ptr<  CNTK::NDMask > * >(argp1);
+      arg1 = const_cast< CNTK::NDMask * >((smartarg1 ? smartarg1->get() : 0));
+    }
+  }
+  arg2 = obj1;
+  {
+    try {
+      CNTK_NDMask_mask_from_numpy(arg1,arg2); 
+    }
+    catch (Swig::DirectorException &e) {
+      SWIG_exception(SWIG_RuntimeError,e.what()); 
+    }
+    catch (std::runtime_error &e) {
+      SWIG_exception(SWIG_RuntimeError,e.what()); 
+    }
+    catch (std::invalid_argument &e) {
+      SWIG_exception(SWIG_RuntimeError,e.what()); 
+    }
+    catch (std::logic_error &e) {
+      SWIG_exception(SWIG_RuntimeError,e.what()); 
+    }
+    catch (...) {
+      SWIG_exception(SWIG_RuntimeError,"Runtime exception"); 
+    }
+  }
+  resultobj = SWIG_Py_Void();
+  return resultobj;
+fail:
+  return NULL;
+}
+
+
 SWIGINTERN PyObject *NDMask_swigregister(PyObject *SWIGUNUSEDPARM(self), PyObject *args) {
   PyObject *obj;
   if (!PyArg_ParseTuple(args,(char*)"O:swigregister", &obj)) return NULL;
@@ -34180,6 +34299,7 @@ static PyMethodDef SwigMethods[] = {
 	 { (char *)"NDMask_alias", _wrap_NDMask_alias, METH_VARARGS, NULL},
 	 { (char *)"NDMask_copy_from", _wrap_NDMask_copy_from, METH_VARARGS, NULL},
 	 { (char *)"NDMask_to_numpy", _wrap_NDMask_to_numpy, METH_VARARGS, NULL},
+	 { (char *)"NDMask_mask_from_numpy", _wrap_NDMask_mask_from_numpy, METH_VARARGS, NULL},
 	 { (char *)"NDMask_swigregister", NDMask_swigregister, METH_VARARGS, NULL},
 	 { (char *)"new_Value", _wrap_new_Value, METH_VARARGS, NULL},
 	 { (char *)"delete_Value", _wrap_delete_Value, METH_VARARGS, NULL},
@@ -6,8 +6,9 @@
 
 import os
 import sys
+import collections
+import numbers
 import numpy as np
-import scipy.sparse
 from cntk import cntk_py
 
 def precision_numpy(precision):
@@ -26,6 +27,10 @@ def precision_numpy(precision):
     else:
         raise ValueError('precision value: "%s" is not supported'%precision)
 
+# Device descriptors are immutable, so we create them only once and reuse them
+_CPU_DEVICE = cntk_py.DeviceDescriptor_cpudevice()
+_GPU_DEVICES = {}
+
 def cntk_device(device_id):
     '''
     Converts device ID to CNTK DeviceDescriptor instance
@@ -36,9 +41,42 @@ def cntk_device(device_id):
         CNTK DeviceDescriptor
     '''
     if device_id==-1:
-        return cntk_py.DeviceDescriptor_cpudevice()
-    else:
-        return cntk_py.DeviceDescriptor_gpudevice(device_id)        
+        return _CPU_DEVICE
+
+    try:
+        return _GPU_DEVICES[device_id]
+    except KeyError:
+        device = _GPU_DEVICES[device_id] = \
+                cntk_py.DeviceDescriptor_gpudevice(device_id)
+        return device
+
+# Shapes seen so far mapped to their reversed form. The number of distinct
+# shapes in a program is small, so we simply stop caching once the limit is
+# reached.
+_REVERSED_SHAPES = {}
+_REVERSED_SHAPES_MAX_SIZE = 1024
+
+def _reverse_shape(shape):
+    '''
+    Reverses the axes of `shape`, which is used to switch between NumPy's row
+    major and CNTK's column major layout.
+
+    Args:
+        shape (tuple): shape to reverse
+
+    Returns:
+        tuple with the axes of `shape` in reversed order
+    '''
+    try:
+        return _REVERSED_SHAPES[shape]
+    except KeyError:
+        pass
+
+    reversed_shape = tuple(reversed(shape))
+    if len(_REVERSED_SHAPES) < _REVERSED_SHAPES_MAX_SIZE:
+        _REVERSED_SHAPES[shape] = reversed_shape
+
+    return reversed_shape
 
 def cntk_to_numpy_shape(shape):
     '''
@@ -51,14 +89,15 @@ def cntk_to_numpy_shape(shape):
         a tuple that describes the NumPy shape of a tensor
     '''
 
-    shape = tuple(int(s) for s in shape)
+    if not (isinstance(shape, tuple) and all(type(s) is int for s in shape)):
+        shape = tuple(int(s) for s in shape)
 
     shape = shape[:-1]
     if not shape:
         shape = (1,)
 
     # cntk uses column major, thus we reverse the axes
-    return tuple(reversed(shape))
+    return _reverse_shape(shape)
 
 def is_string(value):
     if sys.version_info.major < 3:
@@ -82,7 +121,35 @@ def with_metaclass(meta, *bases):
 
 
 def dense_to_str(data):
-    return ' '.join(data.ravel(order='C').astype(np.str))
+    return ' '.join(data.ravel(order='C').astype(str))
+
+
+def _float64_to_str(data):
+    # Python's repr() of a float is the same shortest round-trip form that
+    # NumPy writes, but is much faster than converting every element with
+    # astype(str)
+    return ' '.join(map(repr, data.ravel(order='C').tolist()))
+
+
+def _integer_to_str(data):
+    # a single formatting call for the whole tensor
+    data = data.ravel(order='C')
+    return (' '.join(['%d'] * data.size)) % tuple(data.tolist())
+
+
+def _dense_converter(dtype):
+    '''
+    Returns the function that converts dense tensors of type `dtype` into
+    their text representation. float32 values have to be formatted by NumPy
+    to get their shortest representation, so they and all other types are
+    handled by :func:`dense_to_str`.
+    '''
+    if dtype == np.float64:
+        return _float64_to_str
+    elif np.issubdtype(dtype, np.integer):
+        return _integer_to_str
+    else:
+        return dense_to_str
 
 
 def sparse_to_str(data):
@@ -108,25 +175,31 @@ def tensors_to_text_format(sample_idx, alias_tensor_map):
     if max_seq_length == 0:
         return ''
 
+    # The type of a tensor does not change over its sequence, so we decide
+    # only once per alias how to convert it.
+    prepared = []
+    for alias, tensor in sorted(alias_tensor_map.items()):
+        if is_tensor(tensor):
+            if not isinstance(tensor, np.ndarray):
+                tensor = np.asarray(tensor)
+            to_str = _dense_converter(tensor.dtype)
+        elif isinstance(tensor, list) and isinstance(tensor[0], dict):
+            to_str = sparse_to_str
+        else:
+            raise ValueError(
+                'expected a tensor (dense) or list of dicts (sparse), but got "%s"' % type(tensor))
+
+        prepared.append((alias, tensor, to_str, len(tensor)))
+
     lines = []
     for seq_idx in range(0, max_seq_length):
         line = []
 
-        for alias, tensor in sorted(alias_tensor_map.items()):
-            if seq_idx >= len(tensor):
+        for alias, tensor, to_str, seq_len in prepared:
+            if seq_idx >= seq_len:
                 # for this alias there no more sequence elements
                 continue
 
-            if is_tensor(tensor):
-                if not isinstance(tensor, np.ndarray):
-                    tensor = np.asarray(tensor)
-                to_str = dense_to_str
-            elif isinstance(tensor, list) and isinstance(tensor[0], dict):
-                to_str = sparse_to_str
-            else:
-                raise ValueError(
-                    'expected a tensor (dense) or list of dicts (sparse), but got "%s"' % type(tensor))
-
             line.append('%s %s' % (alias, to_str(tensor[seq_idx])))
 
         lines.append('%i\t|' % sample_idx + ' |'.join(line))
@@ -149,28 +222,21 @@ def is_tensor(data):
     if not isinstance(data, list):
         return False
 
-    while len(data) > 0:
-        # All but the innermost dimension's values have to be lists
-        try:
-            data[0][0]
-        except:
-            # We reached the innermost dimension
-            try:
-                data[0] + 0
-                return True
-            except:
-                # Innermost type is not a number
-                return False
-
-        if isinstance(data, np.ndarray):
-            return True
-
-        if not isinstance(data[0], list):
-            return False
+    if not data:
+        return True
 
+    # All but the innermost dimension's values have to be lists
+    while isinstance(data[0], list):
         data = data[0]
+        if not data:
+            return False
+
+    # We reached the innermost dimension, whose values have to be numbers
+    value = data[0]
+    if isinstance(value, np.ndarray):
+        return value.ndim == 0
 
-    return True
+    return isinstance(value, (numbers.Number, np.number, np.bool_))
 
 def is_tensor_list(data):
     '''
@@ -202,6 +268,30 @@ def get_temp_filename(directory=None):
 
     return tf.name
 
+_OpsSymbols = collections.namedtuple('_OpsSymbols',
+        ['variable_types', 'Variable', 'constant'])
+
+_OPS_SYMBOLS = None
+
+def _ops_symbols():
+    '''
+    Returns the symbols of `cntk.ops` that are used in this module, most
+    notably the tuple of classes that can be passed as Variable to the CNTK
+    operators. They are imported on first use, because `cntk.ops` imports
+    this module.
+    '''
+    global _OPS_SYMBOLS
+    if _OPS_SYMBOLS is None:
+        from cntk.ops.variables import Constant, Variable, Placeholder
+        from cntk.ops import constant
+        _OPS_SYMBOLS = _OpsSymbols(
+                variable_types=(Constant, Variable, Placeholder,
+                    cntk_py.Constant, cntk_py.Variable, cntk_py.Placeholder),
+                Variable=Variable,
+                constant=constant)
+
+    return _OPS_SYMBOLS
+
 def sanitize_input(arg, fallback_dtype=np.float32):
     """
     Convert to Variable or Constant so that it can be passed as Variable to the CNTK
@@ -218,20 +308,17 @@ def sanitize_input(arg, fallback_dtype=np.float32):
         Constant, if `arg` was a number or NumPy array. Variable otherwise.
     """
 
-    from cntk.ops.variables import Constant, Variable, Placeholder
-    from cntk.ops import constant
-    if isinstance(arg, (Constant, Variable, Placeholder, cntk_py.Constant, cntk_py.Variable, cntk_py.Placeholder)):
+    ops = _ops_symbols()
+    if isinstance(arg, ops.variable_types):
         return arg
 
-    try:
+    # only functions with exactly one output can be converted
+    if hasattr(arg, 'output'):
         var_output = arg.output()
-        if isinstance(var_output, Variable):
+        if isinstance(var_output, ops.Variable):
             return var_output
         else:
             raise ValueError('Cannot convert argument of type "%s" to Variable'%type(arg))
-    except AttributeError:
-        # no function or function with more then one output
-        pass
     
     if isinstance(arg, list) and not arg:
         raise ValueError('input is empty')
@@ -239,7 +326,7 @@ def sanitize_input(arg, fallback_dtype=np.float32):
     if not isinstance(arg, np.ndarray):        
         arg = np.asarray(arg, dtype=fallback_dtype)
 
-    return constant(value=arg)
+    return ops.constant(value=arg)
 
 def get_data_type(arg):
     """
@@ -250,23 +337,36 @@ def get_data_type(arg):
         np.float32 or np.float64
     """
 
-    from cntk.ops.variables import Constant, Variable, Placeholder
-    from cntk.ops import constant    
-
-    if isinstance(arg, (Constant, Variable, Placeholder)):
+    ops = _ops_symbols()
+    if isinstance(arg, ops.variable_types):
         if cntk_py.DataType_Double == arg.get_data_type():
             return np.float64
-    try:
+
+    # only functions with exactly one output can be converted
+    if hasattr(arg, 'output'):
         var_output = arg.output()
-        if isinstance(var_output, Variable):
+        if isinstance(var_output, ops.Variable):
             if cntk_py.DataType_Double == var_output.get_data_type():
                 return np.float64
-    except AttributeError:
-        # no function or function with more then one output
-        pass
     
     return np.float32
 
+def _sequence_mask(seq_lens, max_seq_len):
+    '''
+    Computes which positions of a batch padded to `max_seq_len` hold valid
+    sequence elements.
+
+    Args:
+        seq_lens (list of int): length of every sequence in the batch
+        max_seq_len (int): length to which the sequences are padded
+
+    Returns:
+        boolean NumPy array of shape (len(seq_lens), max_seq_len)
+    '''
+    # position j of sequence i is valid if j < seq_lens[i]
+    return np.greater.outer(np.asarray(seq_lens, dtype=np.int32),
+            np.arange(max_seq_len, dtype=np.int32))
+
 def pad_to_dense(batch):
     """Appends the minimal required amount of zeroes at the end of each sample
     in the batch so that it becomes rectangular. `batch` is assumed to be
@@ -282,21 +382,36 @@ def pad_to_dense(batch):
         Padded NumPy array
     """
 
-    max_seq_len = max(len(r) for r in batch)
+    seq_lens = [len(r) for r in batch]
+    max_seq_len = max(seq_lens)
 
-    # Assuming all sequences elements in all samples have the same shape
-    data_point = np.asarray(batch[0][0])
+    batch = [seq if isinstance(seq, np.ndarray) else np.asarray(seq)
+            for seq in batch]
+
+    # Assuming all sequences elements in all samples have the same shape.
+    # We take it from the sequences themselves, so that also empty sequences
+    # can be checked.
+    sample_shape = batch[0].shape[1:]
+    dtype = batch[0].dtype
+
+    for seq in batch:
+        if seq.shape[1:] != sample_shape:
+            raise ValueError('shape mismatch: expected %s but got '
+                    ' %s'%(str(sample_shape), str(seq.shape[1:])))
+
+    if min(seq_lens) == max_seq_len:
+        # all sequences have the same length, so no padding is needed
+        return np.asarray(batch, dtype=dtype)
 
     # FIXME
     # This is not the most efficient way of dealing with variable length
     # sequences, but so far the only one supported. Once, ragged arrays are
     # natively supported in CNTK, this will change.
-    Z = np.zeros((len(batch), max_seq_len)+(data_point.shape), dtype=data_point.dtype)
+    # np.zeros gets its memory already zeroed, so only the sequences have to
+    # be written
+    Z = np.zeros((len(batch), max_seq_len)+sample_shape, dtype=dtype)
     for idx, seq in enumerate(batch):
-        if seq[0].shape != data_point.shape:
-            raise ValueError('shape mismatch: expected %s but got '
-                    ' %s'%(str(data_point.shape), str(seq[0].shape)))
-        Z[idx, :len(seq)] += seq 
+        Z[idx, :seq_lens[idx]] = seq
     return Z
 
 def sanitize_batch(batch, data_type, dev):
@@ -310,26 +425,31 @@ def sanitize_batch(batch, data_type, dev):
     Returns:
         converted batch
     """
-    from ..cntk_py import Value
-
-    if isinstance(batch, Value):
+    if isinstance(batch, cntk_py.Value):
         return batch
 
     num_seq = len(batch)
-    try:
-        seq_lens = [len(seq) for seq in batch]
-    except:
-        import ipdb;ipdb.set_trace()
+    if isinstance(batch, np.ndarray) and batch.ndim > 1:
+        # all sequences of a rectangular batch have the same length
+        seq_lens = [batch.shape[1]] * num_seq
+    else:
+        try:
+            seq_lens = [len(seq) for seq in batch]
+        except TypeError:
+            raise ValueError('expected a batch of sequences, but got "%s"'
+                    % type(batch))
 
-    use_mask = set(seq_lens)!=1
+    use_mask = len(set(seq_lens)) != 1
 
     if use_mask:
         # If not all sequences are of the same length, we have to pad them to
         # the same length and create a mask over the original data.
-        from cntk.cntk_py import NDMask
-        mask = NDMask((max(seq_lens), num_seq), dev)
-        for idx, seq_len in enumerate(seq_lens):
-            mask.mask_section((seq_len, idx), (cntk_py.InferredDimension, 1)) 
+        # The mask is built in NumPy and handed over to CNTK in one call.
+        # Just as NDMask.to_numpy(), every row represents one sequence.
+        max_seq_len = max(seq_lens)
+        mask_np = _sequence_mask(seq_lens, max_seq_len).astype(np.uint8)
+        mask = cntk_py.NDMask((max_seq_len, num_seq), dev)
+        mask.mask_from_numpy(mask_np)
 
         # Then we pad the batch to rectangular shape
         if isinstance(batch, list):
@@ -357,9 +477,9 @@ def sanitize_batch(batch, data_type, dev):
     ndav = create_NDArrayView_from_NumPy(batch, dev)
 
     if use_mask:
-        value = Value(ndav, mask)
+        value = cntk_py.Value(ndav, mask)
     else:
-        value = Value(ndav)
+        value = cntk_py.Value(ndav)
 
     return value
 
@@ -406,7 +526,14 @@ def remove_masked_elements(batch, mask):
     Returns:
         a list of ndarrays
     '''
-    return [seq[mask[idx]==1] for idx,seq in enumerate(batch)]
+    if len(mask) == 0:
+        return []
+
+    valid = mask == 1
+    # gather all valid elements at once and split them into the sequences
+    # afterwards, which are views into the gathered array
+    seq_ends = np.cumsum(valid.sum(axis=1))
+    return np.split(batch[valid], seq_ends[:-1])
 
 def ones_like(batch, precision_numpy):
     '''
@@ -416,23 +543,74 @@ def ones_like(batch, precision_numpy):
     Args:
         batch (list of NumPy arrays): a list of sequences, which are NumPy arrays
     '''
-    return [np.ones_like(sample, dtype=precision_numpy) for sample in batch]
+    shapes = []
+    sizes = []
+    for sample in batch:
+        if not isinstance(sample, np.ndarray):
+            # samples can also be given as (nested) lists
+            sample = np.asarray(sample)
+        shapes.append(sample.shape)
+        sizes.append(sample.size)
+
+    # allocate the ones for all samples at once and hand out views into it
+    ones = np.ones(sum(sizes), dtype=precision_numpy)
+    result = []
+    offset = 0
+    for shape, size in zip(shapes, sizes):
+        result.append(ones[offset:offset+size].reshape(shape))
+        offset += size
+    return result
 
 def create_NDArrayView(shape, data_type, dev):
     if not np.isscalar(shape):
     # cntk uses column major, thus we reverse the shape    
-        shape = tuple(reversed(shape))
+        shape = _reverse_shape(tuple(shape))
     # FIXME only dense supported so far
     view = cntk_py.NDArrayView(data_type, cntk_py.StorageFormat_Dense, shape, dev)
     return view
 
+def _as_column_major(nd):
+    '''
+    Returns `nd` in the layout expected by the NDArrayView constructor, which
+    copies the raw buffer and reverses the shape. The buffer of a C-contiguous
+    array is the column major buffer of the reversed shape, so this copies
+    only if `nd` is not C-contiguous already.
+
+    Args:
+        nd (`ndarray`): row major NumPy array
+
+    Returns:
+        C-contiguous `ndarray`
+    '''
+    # np.ascontiguousarray() would turn a 0-d array into shape (1,). We leave
+    # those and non-arrays untouched so that the NDArrayView constructor
+    # keeps rejecting them.
+    if not isinstance(nd, np.ndarray) or nd.ndim == 0:
+        return nd
+
+    return np.ascontiguousarray(nd)
+
+def _as_row_major(nd):
+    '''
+    Returns a row major view on the Fortran-ordered array that
+    NDArrayView.to_numpy() returns for CNTK's column major data. No data is
+    copied.
+
+    Args:
+        nd (`ndarray`): Fortran-ordered array with CNTK's axes order
+
+    Returns:
+        `ndarray` with the axes in NumPy's order
+    '''
+    return nd.T
+
 def create_NDArrayView_from_NumPy(nd, dev):              
-    view = cntk_py.NDArrayView(nd, dev, False)
+    view = cntk_py.NDArrayView(_as_column_major(nd), dev, False)
     return view
 
 def create_Value_for_Variable(var, shape=None, dev=None, mask=None):
     if not dev:
-        dev = cntk_py.DeviceDescriptor_cpudevice()
+        dev = _CPU_DEVICE
 
     if shape is None:
         shape = var.shape().dimensions()
@@ -452,26 +630,35 @@ def create_Value_from_NumPy(nd, dev):
     value = cntk_py.Value(view)
     return value
 
+_FLOAT_DTYPES = ('float', 'float32', np.float32, np.dtype(np.float32))
+_DOUBLE_DTYPES = ('double', 'float64', np.float64, np.dtype(np.float64))
+
+_NUMPY_DTYPE_MAP = dict(
+        [(t, np.float32) for t in _FLOAT_DTYPES] +
+        [(t, np.float64) for t in _DOUBLE_DTYPES])
+
+_CNTK_DTYPE_MAP = dict(
+        [(t, cntk_py.DataType_Float) for t in _FLOAT_DTYPES] +
+        [(t, cntk_py.DataType_Double) for t in _DOUBLE_DTYPES] +
+        [(t, t) for t in (cntk_py.DataType_Float, cntk_py.DataType_Double,
+            cntk_py.DataType_Unknown)])
+
 def sanitize_dtype_numpy(dtype):
-    if dtype in ('float', 'float32', np.float32):
-        return np.float32
-    elif dtype in ('double', 'float64', np.float64):
-        return np.float64
-    else:
+    try:
+        return _NUMPY_DTYPE_MAP[dtype]
+    except (KeyError, TypeError):
         raise ValueError('data type "%s" is not supported'%dtype)
 
 def sanitize_dtype_cntk(dtype):           
-    if dtype in (cntk_py.DataType_Float, cntk_py.DataType_Double,
-            cntk_py.DataType_Unknown):
-        return dtype
-    if dtype in ('float', 'float32', np.float32):
-        return cntk_py.DataType_Float
-    elif dtype in ('double', 'float64', np.float64):
-        return cntk_py.DataType_Double
-    elif not dtype:
+    try:
+        return _CNTK_DTYPE_MAP[dtype]
+    except (KeyError, TypeError):
+        pass
+
+    if not dtype:
         return cntk_py.DataType_Unknown
-    else:
-        raise ValueError('data type "%s" is not supported'%dtype)
+
+    raise ValueError('data type "%s" is not supported'%dtype)
 
 def _py_dict_to_cntk_dict(py_dict):
     '''
@@ -487,12 +674,9 @@ def _py_dict_to_cntk_dict(py_dict):
             res[k] = cntk_py.DictionaryValueFromDict(_py_dict_to_cntk_dict(v))
         #TODO: add support to list of lists ?
         elif isinstance(v,list):
-            l = list()
-            for e in v:
-                if isinstance(e,dict):
-                    l.append(cntk_py.DictionaryValueFromDict(_py_dict_to_cntk_dict(e)))
-                else:
-                    l.append(cntk_py.DictionaryValue(v))
+            l = [cntk_py.DictionaryValueFromDict(_py_dict_to_cntk_dict(e))
+                    if isinstance(e,dict) else cntk_py.DictionaryValue(e)
+                    for e in v]
             res[k] = cntk_py.DictionaryValue(l)
         else:
             res[k] = cntk_py.DictionaryValue(v)
@@ -509,6 +693,24 @@ def create_minibatch_source(config_dict):
     cntk_dict = _py_dict_to_cntk_dict(config_dict)
     return cntk_py.create_composite_minibatch_source(cntk_dict)
 
+def _value_to_numpy(value):
+    '''
+    Converts a CNTK Value into its NumPy representation, crossing into CNTK
+    only once for the data and once for the mask.
+
+    Args:
+        value (:class:`cntk_py.Value`): value to convert
+
+    Returns:
+        tuple of the row major NumPy data, from which the masked elements have
+        been removed, and the mask of `value` (None if it is not masked)
+    '''
+    np_data = _as_row_major(value.data().to_numpy())
+    mask = value.mask()
+    if mask:
+        np_data = remove_masked_elements(np_data, mask.to_numpy())
+    return np_data, mask
+
 def eval(op, precision, device_id, input_map=None, backward_pass=False):
     '''
     It evaluates `op` on the data provided by the reader. This is useful
@@ -540,21 +742,16 @@ def eval(op, precision, device_id, input_map=None, backward_pass=False):
 
     forward_output = {}
     forward_output_mask = {}
+    root_gradients = {} 
     for v in op.outputs():
-        value = forward_out_var_map[v]
-        np_data = value.data().to_numpy() 
-        np_data = np_data.reshape(tuple(reversed(np_data.shape)))
-        if value.mask():
-            np_data = remove_masked_elements(np_data, value.mask().to_numpy())
+        np_data, mask = _value_to_numpy(forward_out_var_map[v])
         forward_output[v] = np_data
-        forward_output_mask[v] = value.mask()
+        forward_output_mask[v] = mask
+        if backward_pass:
+            root_gradients[v] = ones_like(np_data, pn)
 
     assert backward_pass
     if backward_pass:
-        root_gradients = {} 
-        for v, o in forward_output.items():
-            ones_grad = ones_like(o, pn)
-            root_gradients[v] = ones_grad
         root_gradients = sanitize_var_map(root_gradients, pn, device)
 
         backward_var_map = dict((var, None) for var in forward_in_var_map)
@@ -563,11 +760,7 @@ def eval(op, precision, device_id, input_map=None, backward_pass=False):
 
         backward_output = {}
         for var, value in backward_var_map.items():
-            np_data = value.data().to_numpy() 
-            np_data = np_data.reshape(tuple(reversed(np_data.shape)))
-            if value.mask():
-                np_data = remove_masked_elements(np_data, value.mask().to_numpy())
-            backward_output[var] = np_data
+            backward_output[var], _ = _value_to_numpy(value)
 
         return forward_output, backward_output
 
@@ -7,9 +7,12 @@
 import numpy
 import pytest
 
+from cntk import cntk_py
+
 from cntk.tests.test_utils import precision, PRECISION_TO_TYPE
 from cntk.ops import *
 from cntk.utils import *
+from cntk.utils import _as_column_major, _sequence_mask
 
 # Keeping things short
 AA = np.asarray
@@ -44,6 +47,15 @@ def test_tensor_conversion_exceptions(idx, alias_tensor_map, expected):
         """\
 0\t|L 2 |W 1 0 1 0
 0\t|W 5 6 7 8"""),
+    (0, {'W': AA([[[0.5, 1.25], [-2, 0.1]]], dtype=np.float32)}, """\
+0\t|W 0.5 1.25 -2.0 0.1\
+"""),
+    (0, {'W': AA([[[0.1, 1.1], [1.0, 1e-05]]], dtype=np.float64)}, """\
+0\t|W 0.1 1.1 1.0 1e-05\
+"""),
+    (0, {'W': AA([[[1e-05, 3.3]]], dtype=np.float32)}, """\
+0\t|W 1e-05 3.3\
+"""),
 ])
 def test_tensor_conversion_dense(idx, alias_tensor_map, expected):
     assert tensors_to_text_format(idx, alias_tensor_map) == expected
@@ -55,6 +67,14 @@ def test_tensor_conversion_dense(idx, alias_tensor_map, expected):
     ([[AA([1, 2])]], False),
     ([AA([1, 2])], False),
     ([AA([1, 2]), AA([])], False),
+    ([AA([])], False),
+    ([], True),
+    ([[]], False),
+    ([AA(1.0)], True),
+    ([np.float32(1)], True),
+    (['a'], False),
+    ([{'a': 1}], False),
+    ([None], False),
 ])
 def test_is_tensor(data, expected):
     assert is_tensor(data) == expected
@@ -70,3 +90,152 @@ def test_is_tensor(data, expected):
 ])
 def test_is_tensor_list(data, expected):
     assert is_tensor_list(data) == expected
+
+SEQ_LENS_AND_SHAPES = [
+    ([1, 3, 2], ()),
+    ([2, 1], (3,)),
+    ([3, 3, 1, 2], (2, 2)),
+    ([2, 2], (3,)),
+]
+
+def _sequences(seq_lens, sample_shape):
+    return [np.arange(l*int(np.prod(sample_shape)), dtype=np.float32).reshape(
+        (l,)+sample_shape) + 10*idx for idx, l in enumerate(seq_lens)]
+
+@pytest.mark.parametrize("seq_lens, sample_shape", SEQ_LENS_AND_SHAPES + [
+    ([2, 0, 1], (3,)),
+])
+def test_pad_to_dense(seq_lens, sample_shape):
+    batch = _sequences(seq_lens, sample_shape)
+    padded = pad_to_dense(batch)
+
+    assert padded.shape == (len(seq_lens), max(seq_lens)) + sample_shape
+    assert padded.dtype == np.float32
+    for idx, seq in enumerate(batch):
+        assert np.array_equal(padded[idx, :len(seq)], seq)
+        assert not padded[idx, len(seq):].any()
+
+@pytest.mark.parametrize("seq_lens, sample_shape", SEQ_LENS_AND_SHAPES + [
+    ([0, 2, 1], ()),
+    ([2, 0], (3,)),
+    ([0, 0], (2, 2)),
+    # batch without any sequences
+    ([], (3,)),
+])
+def test_remove_masked_elements(seq_lens, sample_shape):
+    max_seq_len = max(seq_lens + [1])
+    batch = np.arange(len(seq_lens)*max_seq_len*int(np.prod(sample_shape)),
+            dtype=np.float32).reshape((len(seq_lens), max_seq_len)+sample_shape)
+    mask = AA([[pos < l for pos in range(max_seq_len)] for l in seq_lens],
+            dtype=np.uint8).reshape(len(seq_lens), max_seq_len)
+
+    result = remove_masked_elements(batch, mask)
+
+    assert len(result) == len(seq_lens)
+    for idx, seq in enumerate(result):
+        expected = batch[idx][mask[idx]==1]
+        assert seq.shape == expected.shape
+        assert np.array_equal(seq, expected)
+
+@pytest.mark.parametrize("data", [
+    AA(2.),
+    AA([[1, 2], [3, 4]], dtype=np.float32),
+    AA([[1, 2], [3, 4]], dtype=np.float32).T,
+    AA([[1, 2, 3], [4, 5, 6]], dtype=np.float64)[:, ::2],
+])
+def test_as_column_major(data):
+    result = _as_column_major(data)
+    if data.ndim == 0:
+        # 0-d arrays are passed on unchanged, so that NDArrayView rejects them
+        assert result is data
+    else:
+        assert result.flags['C_CONTIGUOUS']
+        assert np.array_equal(result, data)
+        if data.flags['C_CONTIGUOUS']:
+            assert result is data
+
+@pytest.mark.parametrize("dtype, expected", [
+    ('float', np.float32),
+    ('float32', np.float32),
+    (np.float32, np.float32),
+    (np.dtype('float32'), np.float32),
+    ('double', np.float64),
+    ('float64', np.float64),
+    (np.float64, np.float64),
+    (np.dtype('float64'), np.float64),
+])
+def test_sanitize_dtype_numpy(dtype, expected):
+    assert sanitize_dtype_numpy(dtype) == expected
+
+@pytest.mark.parametrize("dtype", ['int', np.int32, None, [1], []])
+def test_sanitize_dtype_numpy_exceptions(dtype):
+    with pytest.raises(ValueError):
+        sanitize_dtype_numpy(dtype)
+
+@pytest.mark.parametrize("dtype, expected", [
+    ('float', cntk_py.DataType_Float),
+    ('float32', cntk_py.DataType_Float),
+    (np.float32, cntk_py.DataType_Float),
+    (np.dtype('float32'), cntk_py.DataType_Float),
+    ('double', cntk_py.DataType_Double),
+    ('float64', cntk_py.DataType_Double),
+    (np.float64, cntk_py.DataType_Double),
+    (np.dtype('float64'), cntk_py.DataType_Double),
+    (cntk_py.DataType_Float, cntk_py.DataType_Float),
+    (cntk_py.DataType_Double, cntk_py.DataType_Double),
+    (cntk_py.DataType_Unknown, cntk_py.DataType_Unknown),
+    (None, cntk_py.DataType_Unknown),
+    ('', cntk_py.DataType_Unknown),
+    # unhashable, but empty
+    ([], cntk_py.DataType_Unknown),
+])
+def test_sanitize_dtype_cntk(dtype, expected):
+    assert sanitize_dtype_cntk(dtype) == expected
+
+@pytest.mark.parametrize("dtype", ['int', np.int32, [1]])
+def test_sanitize_dtype_cntk_exceptions(dtype):
+    with pytest.raises(ValueError):
+        sanitize_dtype_cntk(dtype)
+
+@pytest.mark.parametrize("seq_lens, sample_shape", [
+    ([2, 0, 3, 1], (2,)),
+    ([0, 1], ()),
+    ([3, 1, 2], (2, 2)),
+])
+def test_sanitize_batch_mask(seq_lens, sample_shape, device_id, precision):
+    dtype = PRECISION_TO_TYPE[precision]
+    batch = [np.ones((l,)+sample_shape, dtype=dtype) for l in seq_lens]
+
+    value = sanitize_batch(batch, dtype, cntk_device(device_id))
+
+    assert np.array_equal(value.mask().to_numpy(),
+            _sequence_mask(seq_lens, max(seq_lens)))
+    assert np.array_equal(value.data().to_numpy().T, pad_to_dense(batch))
+
+@pytest.mark.parametrize("seq_lens, sample_shape", SEQ_LENS_AND_SHAPES + [
+    ([0, 2], (3,)),
+])
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_ones_like(seq_lens, sample_shape, dtype):
+    batch = _sequences(seq_lens, sample_shape)
+    # nested lists have to be supported as well
+    batch.append([[1, 2, 3]])
+
+    result = ones_like(batch, dtype)
+
+    assert len(result) == len(batch)
+    for res, sample in zip(result, batch):
+        expected = np.ones_like(sample, dtype=dtype)
+        assert res.shape == expected.shape
+        assert res.dtype == dtype
+        assert np.array_equal(res, expected)
+
+@pytest.mark.parametrize("seq_lens, max_seq_len", [
+    ([1, 3, 2], 3),
+    ([0, 2], 2),
+    ([0, 0], 1),
+    ([2, 2], 4),
+])
+def test_sequence_mask(seq_lens, max_seq_len):
+    expected = AA([[pos < l for pos in range(max_seq_len)] for l in seq_lens])
+    assert np.array_equal(_sequence_mask(seq_lens, max_seq_len), expected)